@@ -1,64 +1,176 @@
-import json
+import asyncio
+import atexit
+import logging
+import logging.handlers
 import os
-import requests
-import ccxt
-import chromadb
-from chromadb.utils import embedding_functions
-from openai import OpenAI
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+import aiohttp
+import ccxt.async_support as ccxt_async
+import numpy as np
+import orjson
+import tiktoken
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from embeddings import get_news_embedding_fn, get_rerank_embedding_fn
+from news_index import NEWS_INDEX_FILE, load_news_index, search_news_index
+from portfolio import INITIAL_USDT, LEGACY_PORTFOLIO_FILE, PORTFOLIO_DB, ensure_portfolio, load_portfolio, record_trade
 
 load_dotenv()
-client = OpenAI()
+aclient = AsyncOpenAI()
+
+# Logging: the hot path only enqueues records; a listener thread does the formatting and console/file writes
+LOG_FILE = "agent.log"
+logger = logging.getLogger("agent")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.Queue(-1)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.setFormatter(_log_formatter)
+_file_handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+_file_handler.setFormatter(_log_formatter)
+_log_listener = logging.handlers.QueueListener(_log_queue, _console_handler, _file_handler)
+# The shared library modules log under their own names; send them through the same queue
+for _module_logger in (logging.getLogger("embeddings"), logging.getLogger("news_index")):
+    _module_logger.setLevel(logging.INFO)
+    _module_logger.propagate = False
+    _module_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener.start()
+atexit.register(_log_listener.stop)  # Flushes whatever is still queued on exit
+
+# One exchange instance shared by every concurrent coin analysis, so Binance rate limits are respected
+_EXCHANGE = ccxt_async.binanceus({'enableRateLimit': True})
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-PORTFOLIO_FILE = "paper_portfolio.json"
+PORTFOLIO_PRETTY_FILE = "paper_portfolio.pretty.json"  # Human-readable copy, written once at process end
+YEARLY_CACHE_FILE = "yearly_cache.json"
+OHLCV_CACHE_TTL = 30  # seconds
+NEWS_CACHE_TTL = 60  # seconds
+PRICE_CACHE_TTL = 5  # seconds
+TICKER_CACHE_TTL = 10  # seconds
+
+# Set NEWS_RERANK=1 to re-score the static-model candidates with BGE before keeping top_k
+NEWS_RERANK = os.getenv("NEWS_RERANK") == "1"
+RERANK_CANDIDATES = 20
+
+CYCLE_INTERVAL_SECONDS = 900  # One trading cycle every 15 minutes
+
+# Prompt size guard: system prompt + user trigger + tool results must fit in this many tokens
+MAX_PROMPT_TOKENS = 12000
 
 
 # ==========================================
 # 0. Virtual Portfolio Management
 # ==========================================
 def init_portfolio():
-    if not os.path.exists(PORTFOLIO_FILE):
-        initial_state = {
-            "USDT": 10000.0,  # Starting virtual balance: $10,000
-            "holdings": {}
-        }
-        with open(PORTFOLIO_FILE, "w") as f:
-            json.dump(initial_state, f, indent=4)
-        print(f"[*] Initialized new paper trading portfolio with $10,000 USDT.")
+    status = ensure_portfolio()
+    if status == "new":
+        logger.info("Initialized new paper trading portfolio with $%s USDT.", f"{INITIAL_USDT:,.0f}")
+    elif status == "migrated":
+        logger.info("Imported %s into %s.", LEGACY_PORTFOLIO_FILE, PORTFOLIO_DB)
 
 
-def load_portfolio():
-    with open(PORTFOLIO_FILE, "r") as f:
-        return json.load(f)
-
-
-def save_portfolio(data):
-    with open(PORTFOLIO_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+def export_portfolio_snapshot():
+    if not os.path.exists(PORTFOLIO_DB):
+        return
+    with open(PORTFOLIO_PRETTY_FILE, "wb") as f:
+        f.write(orjson.dumps(load_portfolio(), option=orjson.OPT_INDENT_2))
 
 
 # ==========================================
 # 1. Telegram Push Module
 # ==========================================
-def send_telegram_message(text: str):
+_tg_session = None  # One aiohttp session for the whole process, created inside the running event loop
+_tg_pending = set()  # Pushes in flight; the set keeps the tasks referenced until they finish
+
+
+def get_telegram_session():
+    global _tg_session
+    if _tg_session is None or _tg_session.closed:
+        _tg_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=10),
+            connector=aiohttp.TCPConnector(limit=2)
+        )
+    return _tg_session
+
+
+async def close_telegram_session():
+    if _tg_session is not None:
+        await _tg_session.close()
+
+
+async def warm_telegram_session():
+    # Open the TLS connection to api.telegram.org ahead of time so the push itself is a plain keep-alive POST
+    if not BOT_TOKEN or not CHAT_ID:
+        return
+    try:
+        async with get_telegram_session().head("https://api.telegram.org"):
+            pass
+    except Exception:
+        pass  # The push will simply open its own connection
+
+
+async def send_telegram_message(text: str):
     if not BOT_TOKEN or not CHAT_ID:
-        print("[!] Telegram keys missing. Skipping push.")
+        logger.warning("Telegram keys missing. Skipping push.")
         return
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload = {"chat_id": CHAT_ID, "text": text, "parse_mode": "Markdown"}
     try:
-        requests.post(url, json=payload, timeout=10)
-        print("[+] Telegram push successful!")
+        async with get_telegram_session().post(url, json=payload):
+            pass
+        logger.info("Telegram push successful!")
     except Exception as e:
-        print(f"[-] Telegram push failed: {e}")
+        logger.warning("Telegram push failed: %s", e)
+
+
+def push_telegram_message(text: str):
+    # Fire and forget: the coin's analysis doesn't wait on the Telegram round trip
+    task = asyncio.create_task(send_telegram_message(text))
+    _tg_pending.add(task)
+    task.add_done_callback(_tg_pending.discard)
+
+
+async def drain_telegram_pushes():
+    if _tg_pending:
+        await asyncio.gather(*_tg_pending, return_exceptions=True)
 
 
 # ==========================================
 # 2. System Prompt (JSON Execution Mode)
 # ==========================================
-TRADER_SYSTEM_PROMPT = """
+_ENCODING = tiktoken.encoding_for_model("gpt-4o")
+_FULLWIDTH_PUNCTUATION = str.maketrans("，。：；！？（）【】“”‘’", ",.:;!?()[]\"\"''")
+
+
+def count_tokens(text: str) -> int:
+    return len(_ENCODING.encode(text))
+
+
+def fit_tokens(text: str, max_tokens: int) -> str:
+    tokens = _ENCODING.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return _ENCODING.decode(tokens[:max_tokens]) + "\n[...truncated]"
+
+
+def compact_prompt(text: str) -> str:
+    # Indentation, repeated spaces, blank lines and full-width punctuation all cost tokens on every call
+    # without changing the instructions
+    text = text.translate(_FULLWIDTH_PUNCTUATION)
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+TRADER_SYSTEM_PROMPT = compact_prompt("""
 You are a ruthless Crypto Quantitative Trading Bot. Your sole purpose is to maximize profit and rigorously protect capital. You are NOT a passive long-term investor. You are an agile swing trader.
 
 RULES:
@@ -77,73 +189,237 @@ CRITICAL TRADING LOGIC:
 - [AGGRESSIVE BUYING]: If you observe 1) Price bouncing strongly off a 3-Day Support level, 2) Major bullish news catalysts, OR 3) Strong upward volume and momentum breaking resistance, OR 4) Any other reason you think it is a good time to buy in the bottom, you MUST output 'BUY'. Do not be paralyzed by fear. Allocate a reasonable amount of your available USDT (e.g., 10% to 20%) to capture the trend.
 - [DO NOT BE GREEDY]: It is better to SELL and hold USDT than to watch your portfolio bleed.
 - [SCALING OUT]: You don't have to sell everything. You can SELL a portion (e.g., 30% or 50% of your holdings' USDT value) to manage risk.
-"""
+""")
+_SYSTEM_PROMPT_TOKENS = count_tokens(TRADER_SYSTEM_PROMPT)
+
+_SYSTEM_MSG = {"role": "system", "content": TRADER_SYSTEM_PROMPT}
 
 
 # ==========================================
 # 3. Knowledge Base & Tools
 # ==========================================
+class _TTLCache:
+    # key -> (stored_at, value), oldest write first. The process runs indefinitely and news keys are free-form
+    # model queries, so set() drops expired entries and caps the size. Locked: set() is called from worker threads.
+    def __init__(self, ttl: float, maxsize: int = 128):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize or now - next(iter(self._entries.values()))[0] >= self.ttl:
+                self._entries.popitem(last=False)
+
+
+_news_cache = _TTLCache(NEWS_CACHE_TTL)  # (normalized query, top_k) -> report
+_price_cache = _TTLCache(PRICE_CACHE_TTL)  # symbol -> report
+_ohlcv_cache = _TTLCache(OHLCV_CACHE_TTL)  # (symbol, timeframe, limit) -> candles as a float64 array
+_ticker_cache = _TTLCache(TICKER_CACHE_TTL)  # symbol -> ccxt ticker, seeded by prefetch_tickers and get_ticker
+
+
+def news_index_mtime():
+    return os.path.getmtime(NEWS_INDEX_FILE) if os.path.exists(NEWS_INDEX_FILE) else None
+
+
 def init_knowledge_base():
     try:
-        chroma_client = chromadb.PersistentClient(path="./news_db")
-        embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="BAAI/bge-small-zh-v1.5")
-        return chroma_client.get_collection(name="crypto_news", embedding_function=embedding_fn)
+        index, docs = load_news_index()
+        # Warm-up: load the embedding model before any real request
+        get_news_embedding_fn()(["warmup"])
+        return index, docs
     except Exception as e:
-        print(f"[-] ChromaDB Error: {e}")
-        return None
+        logger.error("News index Error: %s", e)
+        return None, []
+
+
+_news_index_loaded_at = news_index_mtime()
+news_index, news_docs = init_knowledge_base()
+
+
+def refresh_knowledge_base():
+    # news.py appends on its own schedule; a long-running agent picks the new items up between cycles
+    global news_index, news_docs, _news_index_loaded_at
+    mtime = news_index_mtime()
+    if mtime == _news_index_loaded_at:
+        return
+    _news_index_loaded_at = mtime
+    news_index, news_docs = init_knowledge_base()
+    logger.info("Reloaded news index: %d documents.", len(news_docs))
+
+
+def warm_rerank_model():
+    # Loading (or first-time exporting) the ONNX re-ranker is seconds of work; do it before the first cycle
+    if NEWS_RERANK:
+        get_rerank_embedding_fn()(["warmup"])
+
+
+def rerank_news(queries: list, docs_per_query: list, top_k: int) -> list:
+    # Second stage: score every query's candidates with BGE in one forward pass, keep the best top_k per query
+    texts = list(queries) + [doc for docs in docs_per_query for doc in docs]
+    if len(texts) == len(queries):
+        return docs_per_query
+    vectors = np.asarray(get_rerank_embedding_fn()(texts))
+    query_vectors, doc_vectors = vectors[:len(queries)], vectors[len(queries):]
+
+    reranked = []
+    start = 0
+    for query_vector, docs in zip(query_vectors, docs_per_query):
+        scores = doc_vectors[start:start + len(docs)] @ query_vector
+        start += len(docs)
+        reranked.append([docs[i] for i in np.argsort(-scores)[:top_k]])
+    return reranked
+
+
+def search_crypto_news_batch(queries: list, top_k: int = 10) -> list:
+    logger.info("Tool executing: Searching news for %s...", queries)
+    if news_index is None: return ["DB not ready."] * len(queries)
+
+    # Repeated queries (e.g. two coins both asking about "Bitcoin") are served from the cache
+    keys = [(query.strip().lower(), top_k) for query in queries]
+    reports = [_news_cache.get(key) for key in keys]
+    misses = [i for i, report in enumerate(reports) if report is None]
+    if not misses:
+        return reports
+
+    # One search embeds every missed query text in a single pass, then scans the in-memory flat index
+    miss_queries = [queries[i] for i in misses]
+    n_results = max(top_k, RERANK_CANDIDATES) if NEWS_RERANK else top_k
+    docs_per_query = search_news_index(news_index, news_docs, miss_queries, n_results)
+    if NEWS_RERANK:
+        docs_per_query = rerank_news(miss_queries, docs_per_query, top_k)
+
+    for i, docs in zip(misses, docs_per_query):
+        if docs:
+            reports[i] = "\n".join([f"- {doc}" for doc in docs])
+        else:
+            reports[i] = "No recent news found."
+        _news_cache.set(keys[i], reports[i])
+    return reports
+
+
+def load_yearly_cache():
+    if not os.path.exists(YEARLY_CACHE_FILE):
+        return {}
+    try:
+        with open(YEARLY_CACHE_FILE, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, ValueError):
+        return {}
 
 
-db_collection = init_knowledge_base()
+def save_yearly_cache(data):
+    # Write-then-rename so a crash never leaves a half-written cache behind
+    tmp_file = YEARLY_CACHE_FILE + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(orjson.dumps(data))
+    os.replace(tmp_file, YEARLY_CACHE_FILE)
 
 
-def search_crypto_news(query: str, top_k: int = 10) -> str:
-    print(f"[*] Tool executing: Searching news for '{query}'...")
-    if not db_collection: return "DB not ready."
+# The process is long-lived: read the file once and serve hits from memory. It is only rewritten on a miss,
+# once per symbol per UTC day, so it still carries over to the next start.
+_yearly_cache = load_yearly_cache()  # symbol -> {"date", "hi", "lo"}
 
-    # Increased top_k to 5 for better fundamental context
-    results = db_collection.query(query_texts=[query], n_results=top_k)
-    if results['documents'] and len(results['documents'][0]) > 0:
-        return "\n".join([f"- {doc}" for doc in results['documents'][0]])
-    return "No recent news found."
 
+async def fetch_candles(symbol: str, timeframe: str, limit: int):
+    # Reused for OHLCV_CACHE_TTL seconds
+    # Format: [timestamp, open, high, low, close, volume]
+    key = (symbol, timeframe, limit)
+    cached = _ohlcv_cache.get(key)
+    if cached is not None:
+        return cached
 
-def get_crypto_price(symbol: str) -> str:
-    print(f"[*] Tool executing: Fetching 3-day 15m K-line data for {symbol}...")
+    ohlcv = await _EXCHANGE.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+    candles = np.asarray(ohlcv, dtype=np.float64)
+    _ohlcv_cache.set(key, candles)
+    return candles
+
+
+async def fetch_yearly_range(symbol: str):
+    # The 1-year high/low only moves once a day: cache it per symbol + UTC date
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    entry = _yearly_cache.get(symbol)
+    if entry and entry["date"] == today:
+        return entry["hi"], entry["lo"]
+
+    daily_ohlcv = await _EXCHANGE.fetch_ohlcv(symbol, timeframe='1d', limit=365)
+    if not daily_ohlcv:
+        return "N/A", "N/A"
+
+    daily = np.asarray(daily_ohlcv, dtype=np.float64)
+    yearly_high = float(daily[:, 2].max())
+    yearly_low = float(daily[:, 3].min())
+
+    # Update + save run without an await in between, so concurrent coins can't drop each other's entries
+    _yearly_cache[symbol] = {"date": today, "hi": yearly_high, "lo": yearly_low}
+    save_yearly_cache(_yearly_cache)
+    return yearly_high, yearly_low
+
+
+async def prefetch_tickers(symbols: list):
+    # One REST call for every coin of the cycle instead of one fetch_ticker per coin
     try:
-        exchange = ccxt.binanceus({'enableRateLimit': True})
+        tickers = await _EXCHANGE.fetch_tickers(symbols)
+    except Exception as e:
+        logger.warning("Ticker prefetch failed, each coin will fetch its own: %s", e)
+        return
+    for symbol, ticker in tickers.items():
+        _ticker_cache.set(symbol, ticker)
+
+
+async def get_ticker(symbol: str):
+    # The price tool and the trade that follows it a few seconds later share one request
+    cached = _ticker_cache.get(symbol)
+    if cached is not None:
+        return cached
+    ticker = await _EXCHANGE.fetch_ticker(symbol)
+    _ticker_cache.set(symbol, ticker)
+    return ticker
+
+
+async def get_crypto_price(symbol: str) -> str:
+    logger.info("Tool executing: Fetching 3-day K-line data for %s...", symbol)
+    cached = _price_cache.get(symbol)
+    if cached is not None:
+        return cached
 
-        # 1. Fetch 24H Ticker snapshot
-        ticker = exchange.fetch_ticker(symbol)
+    try:
+        # 1. Fetch concurrently (latency is the slowest request, not the sum):
+        #    - the 24H Ticker snapshot
+        #    - 3 days of 1h candles (72) for support/resistance: same extremes as 288 15m candles, 4x less to decode
+        #    - the last 5 hours of 15m candles (20) for momentum
+        #    - the 1-Year Macro range (Daily candles)
+        ticker, candles_3d, recent_candles, (yearly_high, yearly_low) = await asyncio.gather(
+            get_ticker(symbol),
+            fetch_candles(symbol, '1h', 72),
+            fetch_candles(symbol, '15m', 20),
+            fetch_yearly_range(symbol),
+        )
         current_price = ticker['last']
         pct_change = ticker['percentage']
 
-        # 2. Fetch OHLCV: 3 days * 24 hours * 4 (15m intervals) = 288 candles
-        # Format: [timestamp, open, high, low, close, volume]
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe='15m', limit=288)
-
-        if not ohlcv:
+        if len(candles_3d) == 0 or len(recent_candles) == 0:
             return f"Current Price: {current_price}, 24H Change: {pct_change}%"
 
-        # 3. Calculate 3-day Support and Resistance
-        highs = [candle[2] for candle in ohlcv]
-        lows = [candle[3] for candle in ohlcv]
-        highest_3d = max(highs)
-        lowest_3d = min(lows)
+        # 2. Calculate 3-day Support and Resistance (column reductions over one contiguous array)
+        highest_3d = float(candles_3d[:, 2].max())
+        lowest_3d = float(candles_3d[:, 3].min())
 
-        # 4. Extract the most recent 5 candles to show immediate momentum
-        recent_candles = ohlcv[-20:]
+        # 3. Close/volume of the most recent 5 hours to show immediate momentum
         recent_trend = "\n".join([
-            f"  - Close: {c[4]}, Vol: {c[5]}" for c in recent_candles
+            f"  - Close: {close}, Vol: {vol}" for close, vol in recent_candles[:, 4:6].tolist()
         ])
 
-        # 5. Fetch 1-Year Macro OHLCV (Daily candles)
-        daily_ohlcv = exchange.fetch_ohlcv(symbol, timeframe='1d', limit=365)
-        if daily_ohlcv:
-            yearly_high = max([candle[2] for candle in daily_ohlcv])
-            yearly_low = min([candle[3] for candle in daily_ohlcv])
-        else:
-            yearly_high, yearly_low = "N/A", "N/A"
-
         report = (
             f"[{symbol} Market Data]\n"
             f"Current Price: {current_price}\n"
@@ -154,14 +430,15 @@ def get_crypto_price(symbol: str) -> str:
             f"3-Day Low (Support): {lowest_3d}\n"
             f"Recent 15m Candles (Last 5 hours):\n{recent_trend}"
         )
+        _price_cache.set(symbol, report)
         return report
 
     except Exception as e:
         return f"Error fetching price: {e}"
 
 
-def execute_paper_trade(decision_json: dict):
-    print("\n[*] Processing Paper Trade Execution...")
+async def execute_paper_trade(decision_json: dict):
+    logger.info("Processing Paper Trade Execution...")
     try:
         symbol = decision_json['symbol']
         action = decision_json['action'].upper()
@@ -170,23 +447,24 @@ def execute_paper_trade(decision_json: dict):
 
         if action == "HOLD" or amount_usdt <= 0:
             msg = f"⏸️ **ACTION: HOLD**\nSymbol: {symbol}\nReason: {reason}"
-            print(msg)
-            send_telegram_message(msg)
+            logger.info(msg)
+            push_telegram_message(msg)
             return
 
         # Fetch actual current price to calculate coin amount
-        exchange = ccxt.binanceus({'enableRateLimit': True})
-        current_price = exchange.fetch_ticker(symbol)['last']
+        current_price = (await get_ticker(symbol))['last']
         coin_amount = amount_usdt / current_price
 
         portfolio = load_portfolio()
         base_coin = symbol.split('/')[0]  # e.g., 'BTC'
 
         msg = ""
+        trade = None  # (coin, usdt_delta, coin_delta) once the order passes the balance checks
         if action == "BUY":
             if portfolio["USDT"] >= amount_usdt:
                 portfolio["USDT"] -= amount_usdt
                 portfolio["holdings"][base_coin] = portfolio["holdings"].get(base_coin, 0) + coin_amount
+                trade = (base_coin, -amount_usdt, coin_amount)
                 msg = f"🟢 **PAPER TRADE: BUY**\nSymbol: {symbol}\nSpent: ${amount_usdt}\nGot: {coin_amount:.6f} {base_coin}\nPrice: ${current_price}\nReason: {reason}\n💰 Remaining USDT: ${portfolio['USDT']:.2f}"
             else:
                 msg = f"❌ **PAPER TRADE FAILED**\nInsufficient USDT balance. Needed: ${amount_usdt}, Have: ${portfolio['USDT']:.2f}"
@@ -199,34 +477,216 @@ def execute_paper_trade(decision_json: dict):
             # it means the Agent wants to liquidate everything but got hit by a price drop.
             # We automatically adjust the sell amount to our maximum holdings.
             if coin_amount > current_holdings:
-                print(
-                    f"[*] Adjusting sell amount due to slippage. Original needed: {coin_amount:.6f}, Adjusted to max holding: {current_holdings:.6f}")
+                logger.info("Adjusting sell amount due to slippage. Original needed: %.6f, Adjusted to max holding: %.6f",
+                            coin_amount, current_holdings)
                 coin_amount = current_holdings
                 amount_usdt = coin_amount * current_price  # Recalculate the USD value obtained
 
             if current_holdings >= coin_amount and current_holdings > 0:
                 portfolio["holdings"][base_coin] -= coin_amount
                 portfolio["USDT"] += amount_usdt
+                trade = (base_coin, amount_usdt, -coin_amount)
                 msg = f"🔴 **PAPER TRADE: SELL**\nSymbol: {symbol}\nSold: {coin_amount:.6f} {base_coin}\nGot: ${amount_usdt:.2f}\nPrice: ${current_price}\nReason: {reason}\n💰 Current USDT: ${portfolio['USDT']:.2f}"
             else:
                 msg = f"❌ **PAPER TRADE FAILED**\nInsufficient {base_coin} balance. Needed: {coin_amount:.6f}, Have: {current_holdings:.6f}"
 
-        save_portfolio(portfolio)
-        print(msg)
-        send_telegram_message(msg)
+        if trade and not record_trade(*trade):
+            msg = f"❌ **PAPER TRADE FAILED**\nBalance changed before the {action} of {symbol} could be recorded. Nothing was traded."
+        logger.info(msg)
+        push_telegram_message(msg)
 
     except Exception as e:
         error_msg = f"[-] Error executing paper trade: {e}\nRaw JSON: {decision_json}"
-        print(error_msg)
-        send_telegram_message(error_msg)
+        logger.error(error_msg)
+        push_telegram_message(error_msg)
 
 
 # ==========================================
 # 4. Agent Core Engine
 # ==========================================
-def run_trading_agent(symbol_input: str):
-    init_portfolio()
+# Tool schema built once at import and shared by every run
+_TOOLS = (
+    {
+        "type": "function",
+        "function": {
+            "name": "search_crypto_news",
+            "description": "Search local DB for crypto news.",
+            "parameters": {
+                "type": "object",
+                "properties": {"query": {"type": "string"}},
+                "required": ["query"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_crypto_price",
+            "description": "Fetch latest price for symbol.",
+            "parameters": {
+                "type": "object",
+                "properties": {"symbol": {"type": "string"}},
+                "required": ["symbol"]
+            }
+        }
+    }
+)
+
+# The decision schema is fixed, so let the server enforce it: constrained decoding stops right after the
+# closing brace, and the object is a few dozen tokens, so 256 is a generous cap
+_DECISION_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "trade_decision",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "symbol": {"type": "string"},
+                "action": {"type": "string", "enum": ["BUY", "SELL", "HOLD"]},
+                "amount_usdt": {"type": "number"},
+                "reason": {"type": "string"}
+            },
+            "required": ["symbol", "action", "amount_usdt", "reason"],
+            "additionalProperties": False
+        }
+    }
+}
+DECISION_MAX_TOKENS = 256
+DECISION_TEMPERATURE = 0.2
+
+# Request parameters shared by every decision call of every coin, built once
+_DECISION_REQUEST = {
+    "model": "gpt-4o",
+    "response_format": _DECISION_FORMAT,  # Force strict JSON output
+    "max_tokens": DECISION_MAX_TOKENS,
+    "temperature": DECISION_TEMPERATURE,
+}
 
+
+class _JsonObjectTracker:
+    # Brace depth over streamed text, skipping braces inside strings; done once the top-level object closes
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.done = False
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                    break
+        return self.done
+
+
+async def stream_completion(**kwargs):
+    # Stream the completion and assemble content + tool calls. A JSON answer is handed back as soon as its
+    # top-level object is complete instead of waiting for the rest of the stream.
+    stream = await aclient.chat.completions.create(stream=True, **kwargs)
+    chunks = []
+    tool_calls = {}  # stream index -> tool call being assembled from its deltas
+    tracker = _JsonObjectTracker()
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            chunks.append(delta.content)
+            if not tool_calls and tracker.feed(delta.content):
+                await stream.close()
+                break
+        for tc in delta.tool_calls or []:
+            call = tool_calls.setdefault(tc.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+            if tc.id:
+                call["id"] = tc.id
+            if tc.function and tc.function.name:
+                call["function"]["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                call["function"]["arguments"] += tc.function.arguments
+    return "".join(chunks), [tool_calls[i] for i in sorted(tool_calls)]
+
+
+def make_tool_call(call_id: str, name: str, args: dict) -> dict:
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": orjson.dumps(args).decode()}}
+
+
+async def run_news_searches(args_list: list) -> list:
+    # Embedding + index search is blocking, keep it off the event loop
+    return await asyncio.to_thread(search_crypto_news_batch, [args.get("query") for args in args_list])
+
+
+async def run_price_lookups(args_list: list) -> list:
+    return await asyncio.gather(*[get_crypto_price(symbol=args.get("symbol")) for args in args_list])
+
+
+# Tool name -> coroutine serving every call of that tool in a turn; all news searches become one batched query
+_TOOL_TABLE = {
+    "search_crypto_news": run_news_searches,
+    "get_crypto_price": run_price_lookups,
+}
+
+
+def parse_tool_args(arguments: str):
+    try:
+        args = orjson.loads(arguments)
+    except orjson.JSONDecodeError:
+        return None
+    return args if isinstance(args, dict) else None
+
+
+async def execute_tool_calls(tool_calls: list, budget: int) -> list:
+    # A call the model got wrong (invented tool, malformed arguments) gets an error result, not an exception,
+    # so the rest of the turn and the coin's analysis go on
+    results = {}
+    tool_args = {}
+    groups = {}  # tool name -> indices of its calls
+    for i, tool_call in enumerate(tool_calls):
+        name = tool_call["function"]["name"]
+        if name not in _TOOL_TABLE:
+            results[i] = f"Unknown tool: {name}"
+            continue
+        args = parse_tool_args(tool_call["function"]["arguments"])
+        if args is None:
+            results[i] = f"Invalid arguments for {name}: {tool_call['function']['arguments']}"
+            continue
+        tool_args[i] = args
+        groups.setdefault(name, []).append(i)
+
+    # Run every tool's group concurrently (the turn costs the slowest one, not the sum), then scatter the
+    # results back by call index
+    batches = await asyncio.gather(*[
+        _TOOL_TABLE[name]([tool_args[i] for i in indices]) for name, indices in groups.items()
+    ])
+    for indices, batch in zip(groups.values(), batches):
+        results.update(zip(indices, batch))
+
+    tool_messages = []
+    for i, tool_call in enumerate(tool_calls):
+        # Messages keep the order of the calls so every result stays paired with its tool_call_id
+        tool_messages.append({
+            "role": "tool",
+            "tool_call_id": tool_call["id"],
+            "name": tool_call["function"]["name"],
+            "content": fit_tokens(results[i], budget)
+        })
+    return tool_messages
+
+
+async def run_trading_agent(symbol_input: str):
     # 1. Read the current portfolio state BEFORE asking GPT
     portfolio = load_portfolio()
     base_coin = symbol_input.split('/')[0]  # e.g., 'BTC'
@@ -243,94 +703,102 @@ def run_trading_agent(symbol_input: str):
         f"CRITICAL RULE: You CANNOT SELL if your Current Holdings are 0. If you have holdings and the trend is bearish, you MUST consider SELL to stop loss or take profit."
     )
 
-    print(f"\n[User] Command received with portfolio context...")
-
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "search_crypto_news",
-                "description": "Search local DB for crypto news.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {"query": {"type": "string"}},
-                    "required": ["query"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_crypto_price",
-                "description": "Fetch latest price for symbol.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {"symbol": {"type": "string"}},
-                    "required": ["symbol"]
-                }
-            }
-        }
-    ]
+    logger.info("[User] Command received with portfolio context for %s...", symbol_input)
 
     messages = [
-        {"role": "system", "content": TRADER_SYSTEM_PROMPT},
+        _SYSTEM_MSG,
         {"role": "user", "content": system_trigger}
     ]
+    used_tokens = _SYSTEM_PROMPT_TOKENS + count_tokens(system_trigger)
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
+    # 3. Both tools are mandatory, so run them locally and seed the transcript with their results
+    #    instead of spending a full round-trip waiting for the model to ask for them
+    seeded_calls = [
+        make_tool_call("call_prefetch_news", "search_crypto_news", {"query": base_coin}),
+        make_tool_call("call_prefetch_price", "get_crypto_price", {"symbol": symbol_input}),
+    ]
+    # Size guard: split what is left of the prompt budget across this turn's tool results
+    tool_messages = await execute_tool_calls(seeded_calls, max(0, MAX_PROMPT_TOKENS - used_tokens) // len(seeded_calls))
+    used_tokens += sum(count_tokens(m["content"]) for m in tool_messages)
+    messages.append({"role": "assistant", "content": None, "tool_calls": seeded_calls})
+    messages.extend(tool_messages)
+
+    logger.info("Agent thinking and formatting JSON decision for %s...", symbol_input)
+    # Warm the Telegram connection while the decision tokens are streaming in
+    telegram_warmup = asyncio.create_task(warm_telegram_session())
+
+    # 4. One call normally settles it; the tools stay available in case the model wants extra context
+    final_text, extra_calls = await stream_completion(
         messages=messages,
-        tools=tools,
-        tool_choice="auto"
+        tools=_TOOLS,
+        tool_choice="auto",
+        **_DECISION_REQUEST
     )
-
-    response_message = response.choices[0].message
-
-    if response_message.tool_calls:
-        messages.append(response_message)
-        for tool_call in response_message.tool_calls:
-            args = json.loads(tool_call.function.arguments)
-            if tool_call.function.name == "search_crypto_news":
-                result = search_crypto_news(query=args.get("query"))
-            elif tool_call.function.name == "get_crypto_price":
-                result = get_crypto_price(symbol=args.get("symbol"))
-
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "name": tool_call.function.name,
-                "content": result
-            })
-
-        print("[*] Agent thinking and formatting JSON decision...")
-        final_response = client.chat.completions.create(
-            model="gpt-4o",
+    if extra_calls:
+        messages.append({"role": "assistant", "content": final_text or None, "tool_calls": extra_calls})
+        messages.extend(await execute_tool_calls(extra_calls, max(0, MAX_PROMPT_TOKENS - used_tokens) // len(extra_calls)))
+        final_text, _ = await stream_completion(
             messages=messages,
-            response_format={"type": "json_object"}  # Force strict JSON output
+            **_DECISION_REQUEST
         )
-        final_text = final_response.choices[0].message.content
-    else:
-        final_text = response_message.content
+    await telegram_warmup
 
     # Try to parse the final JSON and execute
     try:
-        decision_json = json.loads(final_text)
-        execute_paper_trade(decision_json)
-    except json.JSONDecodeError:
-        print(f"[-] Model failed to return valid JSON. Output was:\n{final_text}")
+        decision_json = orjson.loads(final_text)
+        await execute_paper_trade(decision_json)
+    except orjson.JSONDecodeError:
+        logger.error("Model failed to return valid JSON. Output was:\n%s", final_text)
+
+
+async def analyze_coin(coin: str):
+    logger.info("Initiating automated analysis for %s...", coin)
+    try:
+        await run_trading_agent(coin)
+    except Exception as e:
+        logger.exception("Critical error during %s analysis: %s", coin, e)
+
+
+async def main(target_coins: list):
+    # One long-lived loop instead of one process per cron tick: the OpenAI, exchange and Telegram
+    # connection pools stay warm across cycles
+    try:
+        # Pay every cold start once, before the first cycle, instead of inside the first coin's analysis:
+        # portfolio store, market metadata, re-rank model (blocking, so in a thread) and the Telegram connection
+        init_portfolio()
+        await asyncio.gather(
+            _EXCHANGE.load_markets(),
+            asyncio.to_thread(warm_rerank_model),
+            warm_telegram_session(),
+        )
+
+        while True:
+            # Reloading the index (file read + model warm-up) is blocking: run it in a thread and overlap
+            # it with the ticker prefetch instead of stalling the event loop at the top of every cycle
+            await asyncio.gather(asyncio.to_thread(refresh_knowledge_base), prefetch_tickers(target_coins))
+            # Every coin's seeded news query is its base coin: embed them all in one batched search up front,
+            # so each coin's own search below is a cache hit
+            await asyncio.to_thread(search_crypto_news_batch, [coin.split('/')[0] for coin in target_coins])
+
+            # All coin analyses overlap: wall time is the slowest coin, not the sum
+            await asyncio.gather(*[analyze_coin(coin) for coin in target_coins])
+
+            logger.info("=== Automated Trading Cycle Complete. Next cycle in %d seconds ===", CYCLE_INTERVAL_SECONDS)
+            await asyncio.sleep(CYCLE_INTERVAL_SECONDS)
+    finally:
+        await _EXCHANGE.close()
+        await drain_telegram_pushes()  # Let the last trade messages go out before the session closes
+        await close_telegram_session()
+        export_portfolio_snapshot()
 
 
 if __name__ == "__main__":
-    print("=== Auto Paper Trading Agent Started ===")
+    logger.info("=== Auto Paper Trading Agent Started ===")
 
     # List of coins you want the bot to trade automatically
     target_coins = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
 
-    for coin in target_coins:
-        print(f"\n[*] Initiating automated analysis for {coin}...")
-        try:
-            run_trading_agent(coin)
-        except Exception as e:
-            print(f"[-] Critical error during {coin} analysis: {e}")
-
-    print("\n=== Automated Trading Cycle Complete ===")
\ No newline at end of file
+    try:
+        asyncio.run(main(target_coins))
+    except KeyboardInterrupt:
+        logger.info("=== Auto Paper Trading Agent Stopped ===")
\ No newline at end of file
@@ -1,17 +1,18 @@
-import json
-import os
 import ccxt
+from portfolio import ensure_portfolio, load_portfolio, portfolio_exists
 
-PORTFOLIO_FILE = "paper_portfolio.json"
+# Connecting to Binance.US to fetch real-time prices; one instance keeps markets and the HTTPS session
+# across dashboard refreshes
+_EXCHANGE = ccxt.binanceus({'enableRateLimit': True})
 
 
 def calculate_pnl():
-    if not os.path.exists(PORTFOLIO_FILE):
+    if not portfolio_exists():
         print("[-] Portfolio file not found! Has the bot started trading yet?")
         return
 
-    with open(PORTFOLIO_FILE, "r") as f:
-        portfolio = json.load(f)
+    ensure_portfolio()  # No-op once the agent has run; imports a pre-SQLite JSON portfolio otherwise
+    portfolio = load_portfolio()
 
     print("\n" + "=" * 55)
     print("💰 QUANT PORTFOLIO LIVE DASHBOARD 💰")
@@ -28,31 +29,31 @@ def calculate_pnl():
         return
 
     try:
-        # Connecting to Binance.US to fetch real-time prices
-        exchange = ccxt.binanceus({'enableRateLimit': True})
+        # One request for every held coin instead of one fetch_ticker per coin.
+        # Unlisted symbols would fail the whole batch, so only ask for the ones the exchange knows.
+        markets = _EXCHANGE.load_markets()
+        symbols = [f"{coin}/USDT" for coin, amount in holdings.items() if amount > 0]
+        tickers = _EXCHANGE.fetch_tickers([s for s in symbols if s in markets])
 
+        # Build every row first and print the table once
         total_crypto_value = 0.0
-
-        # Print Table Header
-        print(f"{'COIN':<8} | {'AMOUNT':<12} | {'LIVE PRICE':<14} | {'CURRENT VALUE':<14}")
-        print("-" * 55)
-
-        for coin, amount in holdings.items():
-            if amount <= 0:
+        rows = [
+            f"{'COIN':<8} | {'AMOUNT':<12} | {'LIVE PRICE':<14} | {'CURRENT VALUE':<14}",
+            "-" * 55,
+        ]
+        for symbol in symbols:
+            coin = symbol.split('/')[0]
+            amount = holdings[coin]
+            ticker = tickers.get(symbol)
+            if ticker is None or ticker.get('last') is None:
+                rows.append(f"{coin:<8} | {amount:<12.6f} | [Error fetching price] | N/A")
                 continue
-
-            symbol = f"{coin}/USDT"
-            try:
-                ticker = exchange.fetch_ticker(symbol)
-                current_price = ticker['last']
-                current_value = amount * current_price
-                total_crypto_value += current_value
-
-                print(f"{coin:<8} | {amount:<12.6f} | ${current_price:<13.2f} | ${current_value:<13.2f}")
-            except Exception as e:
-                print(f"{coin:<8} | {amount:<12.6f} | [Error fetching price] | N/A")
-
-        print("-" * 55)
+            current_price = ticker['last']
+            current_value = amount * current_price
+            total_crypto_value += current_value
+            rows.append(f"{coin:<8} | {amount:<12.6f} | ${current_price:<13.2f} | ${current_value:<13.2f}")
+        rows.append("-" * 55)
+        print("\n".join(rows))
 
         # Calculate Total PnL (Assuming $10,000 was the starting balance)
         total_account_value = usdt_balance + total_crypto_value
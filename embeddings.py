@@ -0,0 +1,93 @@
+import logging
+import os
+from functools import lru_cache
+import numpy as np
+import onnxruntime as ort
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+from model2vec import StaticModel
+from tokenizers import Tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Retriever: distilled static-token model, one embedding lookup + mean per text (no transformer pass)
+STATIC_MODEL = "minishlab/potion-base-8M"
+# Collection holding STATIC_MODEL vectors; writer (news.py) and reader (agent_core.py) must agree on both
+NEWS_COLLECTION = "crypto_news_m2v"
+LEGACY_NEWS_COLLECTION = "crypto_news"  # Old BGE-embedded collection, re-ingested by news.py
+
+# Re-ranker: INT8 ONNX export of BGE. The full-precision model also embeds the a_share_news collection (search.py)
+EMBEDDING_MODEL = "BAAI/bge-small-zh-v1.5"
+ONNX_MODEL_DIR = "./bge-small-zh-int8"
+ONNX_MODEL_FILE = os.path.join(ONNX_MODEL_DIR, "onnx", "model_qint8_avx512_vnni.onnx")
+
+
+def _l2_normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class StaticEmbeddingFunction(EmbeddingFunction):
+    def __init__(self):
+        self.model = StaticModel.from_pretrained(STATIC_MODEL)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return _l2_normalize(self.model.encode(list(input))).tolist()
+
+
+def export_quantized_model():
+    # Heavy import (torch), only needed for the one-time export
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    logger.info("Exporting INT8 ONNX copy of %s to %s (one-time)...", EMBEDDING_MODEL, ONNX_MODEL_DIR)
+    model = SentenceTransformer(EMBEDDING_MODEL, backend="onnx")
+    model.save_pretrained(ONNX_MODEL_DIR)
+    export_dynamic_quantized_onnx_model(model, "avx512_vnni", ONNX_MODEL_DIR)
+
+
+# INT8-quantized BGE on ONNX Runtime, drop-in for SentenceTransformerEmbeddingFunction
+class OnnxEmbeddingFunction(EmbeddingFunction):
+    def __init__(self):
+        if not os.path.exists(ONNX_MODEL_FILE):
+            export_quantized_model()
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(ONNX_MODEL_DIR, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=512)
+        self.tokenizer.enable_padding()
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # os.cpu_count() reports logical cores; halve it to get physical cores on SMT machines
+        sess_options.intra_op_num_threads = max(1, (os.cpu_count() or 2) // 2)
+        # Stays on CPU even with a GPU around: the dynamic INT8 ops have no CUDA kernels and would bounce back
+        self.session = ort.InferenceSession(ONNX_MODEL_FILE, sess_options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, input: Documents) -> Embeddings:
+        encodings = self.tokenizer.encode_batch(list(input))
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        last_hidden_state = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        # BGE pools with the [CLS] token, then L2-normalizes
+        return _l2_normalize(last_hidden_state[:, 0]).tolist()
+
+
+@lru_cache(maxsize=1)
+def get_news_embedding_fn():
+    return StaticEmbeddingFunction()
+
+
+@lru_cache(maxsize=1)
+def get_rerank_embedding_fn():
+    return OnnxEmbeddingFunction()
+
+
+@lru_cache(maxsize=1)
+def get_embedding_fn():
+    # Full-precision BGE for collections that were ingested with it; one copy per process, loaded on first use
+    import torch  # Already a dependency of sentence-transformers, only needed to pick the device
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL, device=device)
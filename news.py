@@ -1,9 +1,25 @@
+import logging
 import os
 import time
-import hashlib
+import blake3
 import requests
 import chromadb
-from chromadb.utils import embedding_functions
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from embeddings import LEGACY_NEWS_COLLECTION, NEWS_COLLECTION, get_news_embedding_fn
+from news_index import NEWS_CORPUS_FILE, append_to_news_index
+
+# Small corpus: a sparser graph (M=8, default 16) and construction_ef=64 (default 100) keep inserts cheap.
+# Queries are served from the FAISS index now, so build cost is what matters here; search_ef=32 (default 10)
+# still covers the 20 re-rank candidates if the collection is queried directly. Only applied when the
+# collection is first created.
+HNSW_METADATA = {"hnsw:space": "cosine", "hnsw:M": 8, "hnsw:construction_ef": 64, "hnsw:search_ef": 32}
+
+# One keep-alive session per process: repeated fetches reuse the TLS connection, transient errors are retried
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=16, max_retries=Retry(total=3, backoff_factor=0.5,
+                                                                            status_forcelist=(429, 500, 502, 503, 504))))
 
 
 def fetch_crypto_news(limit: int = 20):
@@ -11,7 +27,7 @@ def fetch_crypto_news(limit: int = 20):
     url = "https://min-api.cryptocompare.com/data/v2/news/?lang=EN"
 
     try:
-        response = requests.get(url, timeout=10)
+        response = _SESSION.get(url, timeout=10)
         response.raise_for_status()
         data = response.json()
 
@@ -35,49 +51,118 @@ def fetch_crypto_news(limit: int = 20):
         return []
 
 
-def get_md5_hash(text: str) -> str:
-    return hashlib.md5(text.encode('utf-8')).hexdigest()
+def get_doc_id(text: str) -> str:
+    # Dedup key only, nothing cryptographic: blake3 (SIMD), 64 hex chars so it can't be mistaken for an md5 id
+    return blake3.blake3(text.encode('utf-8')).hexdigest()
+
+
+def rekey_md5_ids(collection):
+    # One-time re-key of items stored under 32-char md5 ids, reusing their stored vectors. Once done, the
+    # id-only listing finds nothing to move and dedup looks up blake3 ids alone.
+    legacy_ids = [news_id for news_id in collection.get(include=[])["ids"] if len(news_id) == 32]
+    if not legacy_ids:
+        return
+    records = collection.get(ids=legacy_ids, include=["documents", "embeddings", "metadatas"])
+    rows = {get_doc_id(doc): i for i, doc in enumerate(records["documents"])}  # Same text twice -> one item
+    collection.upsert(
+        ids=list(rows),
+        documents=[records["documents"][i] for i in rows.values()],
+        embeddings=[records["embeddings"][i] for i in rows.values()],
+        metadatas=[records["metadatas"][i] for i in rows.values()]
+    )
+    collection.delete(ids=records["ids"])
+    print(f"Re-keyed {len(records['ids'])} items from md5 to blake3 ids.")
+
+
+def migrate_legacy_collection(chroma_client, collection):
+    # One-time re-ingest of the old BGE collection: the static model's vectors have a different size
+    if collection.count() > 0:
+        return
+    try:
+        legacy = chroma_client.get_collection(name=LEGACY_NEWS_COLLECTION, embedding_function=None)
+    except Exception:
+        return  # Fresh install, nothing to migrate
+
+    records = legacy.get(include=["documents", "metadatas"])
+    batch_size = 500
+    for start in range(0, len(records["ids"]), batch_size):
+        end = start + batch_size
+        collection.add(
+            documents=records["documents"][start:end],
+            metadatas=records["metadatas"][start:end],
+            ids=[get_doc_id(doc) for doc in records["documents"][start:end]]
+        )
+    print(f"Re-embedded {len(records['ids'])} items from '{LEGACY_NEWS_COLLECTION}' into '{NEWS_COLLECTION}'.")
+
+
+def seed_news_index(collection):
+    # First run with the FAISS read path: export what Chroma already holds, vectors included
+    if os.path.exists(NEWS_CORPUS_FILE) or collection.count() == 0:
+        return
+    records = collection.get(include=["documents", "embeddings"])
+    append_to_news_index(records["ids"], records["documents"], records["embeddings"])
+    print(f"Seeded {NEWS_CORPUS_FILE} with {len(records['ids'])} existing items.")
 
 
 def update_vector_db():
     print("=== Crypto Auto-Scraper Task Started ===")
-    print("Initializing ChromaDB vector database...")
 
-    chroma_client = chromadb.PersistentClient(path="./news_db")
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="BAAI/bge-small-zh-v1.5")
+    # The HTTP fetch and the database/model startup don't depend on each other: overlap them
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        news_future = pool.submit(fetch_crypto_news, 20)
 
-    # ️ Create or get a NEW collection specifically for crypto
-    collection = chroma_client.get_or_create_collection(
-        name="crypto_news",
-        embedding_function=embedding_fn
-    )
+        print("Initializing ChromaDB vector database...")
+        chroma_client = chromadb.PersistentClient(path="./news_db")
+        embedding_fn = get_news_embedding_fn()
 
-    latest_news = fetch_crypto_news(limit=20)
+        # ️ Create or get a NEW collection specifically for crypto
+        collection = chroma_client.get_or_create_collection(
+            name=NEWS_COLLECTION,
+            embedding_function=embedding_fn,
+            metadata=HNSW_METADATA
+        )
+        migrate_legacy_collection(chroma_client, collection)
+        rekey_md5_ids(collection)
+        seed_news_index(collection)
+
+        latest_news = news_future.result()
 
     if not latest_news:
         print("No news fetched. Exiting.")
         return
 
-    new_count = 0
-    for news_text in latest_news:
-        news_id = get_md5_hash(news_text)
-
-        existing = collection.get(ids=[news_id])
-        if not existing['ids']:
-            collection.add(
-                documents=[news_text],
-                metadatas=[{"source": "cryptocompare", "timestamp": time.time()}],
-                ids=[news_id]
-            )
-            new_count += 1
-            print(f"[NEW] Added: {news_text[:80]}...")
-        else:
-            pass  # Skip existing duplicates
+    # One existence check for the whole fetch instead of one get per item
+    ids = [get_doc_id(news_text) for news_text in latest_news]
+    seen = set(collection.get(ids=ids, include=[])['ids'])
 
-    print(f"Database update complete! Added {new_count} new items.")
-    print(f"Total items in 'crypto_news' collection: {collection.count()}")
+    new_docs = {}  # id -> text; also drops duplicates within this fetch
+    for news_id, news_text in zip(ids, latest_news):
+        if news_id not in seen and news_id not in new_docs:
+            new_docs[news_id] = news_text
+            print(f"[NEW] Added: {news_text[:80]}...")
+    new_ids = list(new_docs)
+
+    if new_ids:
+        # Embed once, outside the DB call: the same vectors go to Chroma and to the FAISS read path
+        new_texts = list(new_docs.values())
+        vectors = embedding_fn(new_texts)
+        now = time.time()
+        collection.upsert(
+            documents=new_texts,
+            embeddings=vectors,
+            metadatas=[{"source": "cryptocompare", "timestamp": now} for _ in new_ids],
+            ids=new_ids
+        )
+        append_to_news_index(new_ids, new_texts, vectors)
+
+    print(f"Database update complete! Added {len(new_ids)} new items.")
+    print(f"Total items in '{NEWS_COLLECTION}' collection: {collection.count()}")
     print("=== Crypto Auto-Scraper Task Finished ===\n")
 
 
 if __name__ == "__main__":
+    # Show the library modules' progress messages (index rebuilds, model export) next to the prints
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("embeddings").setLevel(logging.INFO)
+    logging.getLogger("news_index").setLevel(logging.INFO)
     update_vector_db()
\ No newline at end of file
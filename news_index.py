@@ -0,0 +1,85 @@
+import logging
+import os
+import faiss
+import numpy as np
+import orjson
+from embeddings import get_news_embedding_fn
+
+logger = logging.getLogger(__name__)
+
+# Read path for the news retriever: a flat inner-product FAISS index held in RAM, plus the documents
+# in the same order. news.py appends to both on ingest; agent_core.py only loads them.
+NEWS_CORPUS_FILE = "news_corpus.jsonl"
+NEWS_INDEX_FILE = "news.faiss"
+NEWS_INDEX_TMP_FILE = NEWS_INDEX_FILE + ".tmp"
+
+
+def load_corpus():
+    if not os.path.exists(NEWS_CORPUS_FILE):
+        return []
+    with open(NEWS_CORPUS_FILE, "rb") as f:
+        # A line without its newline is still being appended by the ingest: leave it for the next load
+        return [orjson.loads(line)["document"] for line in f if line.endswith(b"\n") and line.strip()]
+
+
+def new_index(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)  # Inner product on unit vectors == cosine similarity
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+def build_index(docs):
+    # One encode call for the whole corpus: model2vec batches internally, no per-slice Python round trips
+    return new_index(get_news_embedding_fn()(docs))
+
+
+def load_news_index():
+    docs = load_corpus()
+    if not docs:
+        return None, []
+
+    if os.path.exists(NEWS_INDEX_FILE):
+        index = faiss.read_index(NEWS_INDEX_FILE)
+        if index.ntotal == len(docs):
+            return index, docs
+
+    # Missing or out of sync with the corpus (e.g. a crash between the two writes): rebuild from the corpus in
+    # memory only. The ingest is the only writer of NEWS_INDEX_FILE; its next append persists the rebuild.
+    logger.info("Rebuilding the news index from %d documents...", len(docs))
+    return build_index(docs), docs
+
+
+def save_news_index(index):
+    # Write-then-rename: a reader reloading on mtime change never sees a half-written index
+    faiss.write_index(index, NEWS_INDEX_TMP_FILE)
+    os.replace(NEWS_INDEX_TMP_FILE, NEWS_INDEX_FILE)
+
+
+def append_to_news_index(ids, docs, vectors):
+    if len(ids) == 0:
+        return
+    index, _ = load_news_index()
+
+    # Corpus first: if we die before the index is written, the next load sees the mismatch and rebuilds
+    with open(NEWS_CORPUS_FILE, "ab") as f:
+        for news_id, doc in zip(ids, docs):
+            f.write(orjson.dumps({"id": news_id, "document": doc}) + b"\n")
+
+    if index is None:
+        index = new_index(vectors)
+    else:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        index.add(vectors)
+    save_news_index(index)
+
+
+def search_news_index(index, docs, queries, top_k: int, embedding_fn=None):
+    # embedding_fn must be the model the index vectors came from; defaults to the crypto news retriever
+    embedding_fn = embedding_fn or get_news_embedding_fn()
+    query_vectors = np.ascontiguousarray(embedding_fn(queries), dtype=np.float32)
+    faiss.normalize_L2(query_vectors)
+    _, rows = index.search(query_vectors, min(top_k, index.ntotal))
+    return [[docs[i] for i in row if i >= 0] for row in rows]
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import orjson
+
+# Paper portfolio store shared by agent_core.py (writer) and check_pnl.py (reader). SQLite in WAL mode:
+# a trade is a two-row transaction instead of a full-file rewrite, and readers never block the writer.
+PORTFOLIO_DB = "paper_portfolio.db"
+LEGACY_PORTFOLIO_FILE = "paper_portfolio.json"  # Pre-SQLite store, imported once into an empty database
+INITIAL_USDT = 10000.0
+
+_local = threading.local()  # sqlite3 connections are per thread
+
+
+@contextmanager
+def _transaction(conn):
+    # IMMEDIATE takes the write lock up front: reads inside the block see what the writes will be applied to
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def get_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(PORTFOLIO_DB, isolation_level=None)  # Transactions are explicit, see _transaction
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL: a crash can lose the last commit, never corrupt
+        conn.execute("CREATE TABLE IF NOT EXISTS cash (id INTEGER PRIMARY KEY CHECK (id = 0), usdt REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS holdings (coin TEXT PRIMARY KEY, amount REAL NOT NULL)")
+        _local.conn = conn
+    return conn
+
+
+def portfolio_exists():
+    return os.path.exists(PORTFOLIO_DB) or os.path.exists(LEGACY_PORTFOLIO_FILE)
+
+
+def ensure_portfolio():
+    # Returns "new", "migrated" or None when the portfolio was already there
+    conn = get_connection()
+    with _transaction(conn):
+        if conn.execute("SELECT 1 FROM cash").fetchone():
+            return None
+        if os.path.exists(LEGACY_PORTFOLIO_FILE):
+            with open(LEGACY_PORTFOLIO_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+            status = "migrated"
+        else:
+            data = {"USDT": INITIAL_USDT, "holdings": {}}
+            status = "new"
+        conn.execute("INSERT INTO cash (id, usdt) VALUES (0, ?)", (data["USDT"],))
+        conn.executemany("INSERT INTO holdings (coin, amount) VALUES (?, ?)", data["holdings"].items())
+    return status
+
+
+def load_portfolio():
+    # Same shape as the old JSON file: {"USDT": float, "holdings": {coin: amount}}
+    conn = get_connection()
+    row = conn.execute("SELECT usdt FROM cash").fetchone()
+    return {
+        "USDT": row[0] if row else 0.0,
+        "holdings": dict(conn.execute("SELECT coin, amount FROM holdings")),
+    }
+
+
+def record_trade(coin: str, usdt_delta: float, coin_delta: float) -> bool:
+    # Balances are re-checked under the write lock, against what is stored now rather than the caller's earlier
+    # load_portfolio() snapshot. Returns False, changing nothing, if the trade would overdraw USDT or the coin.
+    with _transaction(get_connection()) as conn:
+        usdt = conn.execute("SELECT usdt FROM cash").fetchone()[0]
+        row = conn.execute("SELECT amount FROM holdings WHERE coin = ?", (coin,)).fetchone()
+        amount = row[0] if row else 0.0
+        if usdt + usdt_delta < 0 or amount + coin_delta < 0:
+            return False
+        conn.execute("UPDATE cash SET usdt = usdt + ?", (usdt_delta,))
+        conn.execute(
+            "INSERT INTO holdings (coin, amount) VALUES (?, ?) "
+            "ON CONFLICT(coin) DO UPDATE SET amount = amount + excluded.amount",
+            (coin, coin_delta)
+        )
+    return True
@@ -1,5 +1,6 @@
 import chromadb
-from chromadb.utils import embedding_functions
+from embeddings import get_embedding_fn
+from news_index import new_index, search_news_index
 
 
 def init_retriever():
@@ -7,34 +8,35 @@ def init_retriever():
     # Connect to the local database folder we generated
     chroma_client = chromadb.PersistentClient(path="./news_db")
 
-    # Must use the EXACT SAME embedding model as used for data ingestion
-    chinese_embedding = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="BAAI/bge-small-zh-v1.5")
-
     try:
         # Get the existing collection
-        collection = chroma_client.get_collection(
-            name="a_share_news",
-            embedding_function=chinese_embedding
-        )
-        print(f"Connection successful! The knowledge base currently contains {collection.count()} news items.\n")
-        return collection
+        collection = chroma_client.get_collection(name="a_share_news", embedding_function=None)
+
+        # Read path: copy the stored vectors into an in-memory flat FAISS index once, so every search is a
+        # single matrix scan instead of an HNSW + SQLite round trip. Chroma stays the store the ingest writes to.
+        records = collection.get(include=["documents", "embeddings"])
+        if not records["ids"]:
+            print("The knowledge base is empty. Please run 'news.py' to generate data first.")
+            return None
+        index = new_index(records["embeddings"])
+        print(f"Connection successful! The knowledge base currently contains {index.ntotal} news items.\n")
+        return index, records["documents"]
     except Exception as e:
         print(f"Connection failed. Please ensure 'news.py' has been run successfully to generate data. Error: {e}")
         return None
 
 
-def search_news(collection, query, top_k=3):
+def search_news(retriever, query, top_k=3):
     print(f"\nRetrieving news most relevant to '{query}'...\n" + "=" * 50)
 
     # Execute vector similarity search
-    results = collection.query(
-        query_texts=[query],
-        n_results=top_k
-    )
+    # Must use the EXACT SAME embedding model as used for data ingestion
+    index, docs = retriever
+    results = search_news_index(index, docs, [query], top_k, embedding_fn=get_embedding_fn())
 
     # Extract and print the results
-    if results['documents'] and len(results['documents'][0]) > 0:
-        for i, doc in enumerate(results['documents'][0]):
+    if results[0]:
+        for i, doc in enumerate(results[0]):
             print(f"[{i + 1}] {doc}")
             print("-" * 50)
     else:
@@ -42,9 +44,9 @@ def search_news(collection, query, top_k=3):
 
 
 if __name__ == "__main__":
-    db_collection = init_retriever()
+    retriever = init_retriever()
 
-    if db_collection:
+    if retriever:
         print(
             "Testing Guide: You can enter specific stocks (e.g., Kweichow Moutai, BYD) or macroeconomic concepts (e.g., rate cut, new energy, semiconductors).")
         while True:
@@ -53,4 +55,4 @@ if __name__ == "__main__":
                 print("Exiting the search test.")
                 break
             if user_input.strip():
-                search_news(db_collection, user_input)
\ No newline at end of file
+                search_news(retriever, user_input)
\ No newline at end of file